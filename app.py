@@ -1,13 +1,16 @@
 import logging
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request
 from flask_socketio import SocketIO, emit
 
 import config
 from config import now_il
 import db
 from scraper import StationScraper
+from stations import StationRegistry
+from nearby import NearbyIndex
 from notifier import send_availability_email
 from timeline import TimelineStore
+from transitions import TransitionLog, normalize_bound, sse_chunks, ndjson_chunks, csv_gzip_chunks, parquet_chunks, PARQUET_AVAILABLE
 
 SW_VERSION = now_il().strftime("%Y%m%d-%H%M%S")
 
@@ -18,7 +21,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 if config.DATABASE_URL:
-    db.init_tables(config.DATABASE_URL)
+    db.init_tables(config.DATABASE_URL, seed_stations=config.STATIONS)
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = config.SECRET_KEY
@@ -26,6 +29,9 @@ app.config["TEMPLATES_AUTO_RELOAD"] = True
 app.jinja_env.auto_reload = True
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
 timeline_store = TimelineStore()
+station_registry = StationRegistry()
+nearby_index = NearbyIndex(station_registry)
+transition_log = TransitionLog()
 
 
 @app.after_request
@@ -51,9 +57,10 @@ def on_status_change(station_id, station_name, old_status, new_status, timestamp
 
 def on_station_checked(station_id, status, timestamp, in_use_since=None):
     # Record every check for the Gantt timeline
-    station = next((s for s in config.STATIONS if s["id"] == station_id), None)
+    station = station_registry.get(station_id)
     station_name = station["name"] if station else station_id
     timeline_store.record_check(station_id, station_name, status, timestamp)
+    nearby_index.update(station_id, status, timestamp, in_use_since)
 
     socketio.emit("station_checked", {
         "station_id": station_id,
@@ -73,17 +80,19 @@ def on_cycle_complete(interval):
 
 
 scraper = StationScraper(
-    stations=config.STATIONS,
+    registry=station_registry,
     check_interval=config.CHECK_INTERVAL,
     on_status_change=on_status_change,
     on_station_checked=on_station_checked,
     on_cycle_complete=on_cycle_complete,
+    transition_log=transition_log,
 )
+nearby_index.load(scraper.get_all_statuses())
 
 
 @app.route("/")
 def index():
-    return render_template("index.html", stations=config.STATIONS, sw_version=SW_VERSION)
+    return render_template("index.html", stations=station_registry.all(), sw_version=SW_VERSION)
 
 
 @app.route("/api/status")
@@ -94,6 +103,91 @@ def api_status():
     })
 
 
+@app.route("/api/nearest")
+def api_nearest():
+    try:
+        lat = float(request.args["lat"])
+        lng = float(request.args["lng"])
+        k = int(request.args.get("k", 5))
+        max_km = request.args.get("max_km", type=float)
+    except (KeyError, ValueError):
+        return jsonify({"error": "lat and lng are required numbers"}), 400
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return jsonify({"error": "lat/lng out of range"}), 400
+    available_only = request.args.get("available", "false").lower() in ("1", "true", "yes")
+    return jsonify({
+        "results": nearby_index.query(
+            lat, lng, k=max(1, min(k, 50)), available_only=available_only, max_km=max_km,
+        ),
+    })
+
+
+@app.route("/api/load_stats")
+def api_load_stats():
+    return jsonify(scraper.get_load_stats())
+
+
+@app.route("/api/transitions")
+def api_transitions():
+    cursor = request.args.get("cursor", 0, type=int)
+    limit = max(1, min(request.args.get("limit", 500, type=int), 500))
+    transitions = transition_log.read_since(cursor, limit)
+    if transitions is None:
+        return jsonify({"error": "transition store unavailable"}), 503
+    return jsonify({
+        "transitions": transitions,
+        "next_cursor": transitions[-1]["seq"] if transitions else cursor,
+    })
+
+
+@app.route("/api/transitions/stream")
+def api_transitions_stream():
+    # EventSource reconnects send Last-Event-ID; with no cursor, tail new transitions only
+    cursor = request.args.get("cursor", type=int)
+    if cursor is None:
+        cursor = request.headers.get("Last-Event-ID", type=int)
+    if cursor is None:
+        cursor = transition_log.last_seq
+    follow = request.args.get("follow", "true").lower() not in ("0", "false", "no")
+    events = transition_log.follow(cursor, follow=follow)
+
+    if request.args.get("format") == "ndjson":
+        return Response(ndjson_chunks(events), mimetype="application/x-ndjson")
+    return Response(sse_chunks(events), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+@app.route("/api/transitions/export")
+def api_transitions_export():
+    try:
+        start = normalize_bound(request.args.get("start", ""))
+        end = normalize_bound(request.args.get("end", ""))
+    except ValueError:
+        return jsonify({"error": "start and end must be ISO-8601 timestamps"}), 400
+
+    fmt = request.args.get("format", "csv")
+    if fmt not in ("csv", "parquet"):
+        return jsonify({"error": "format must be csv or parquet"}), 400
+    if fmt == "parquet" and not PARQUET_AVAILABLE:
+        return jsonify({"error": "parquet export requires pyarrow"}), 501
+    try:
+        rows = transition_log.export(start, end)
+    except Exception as e:
+        logger.error(f"Transition export unavailable: {e}")
+        return jsonify({"error": "transition store unavailable"}), 503
+
+    filename = f"transitions_{start[:10]}_{end[:10]}"
+    if fmt == "parquet":
+        return Response(parquet_chunks(rows), mimetype="application/vnd.apache.parquet", headers={
+            "Content-Disposition": f"attachment; filename={filename}.parquet",
+        })
+    return Response(csv_gzip_chunks(rows), mimetype="application/gzip", headers={
+        "Content-Disposition": f"attachment; filename={filename}.csv.gz",
+    })
+
+
 @app.route("/api/timeline")
 def api_timeline():
     return jsonify(timeline_store.get_timeline())
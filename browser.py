@@ -0,0 +1,253 @@
+"""
+Chrome WebDriver lifecycle for the scraper.
+Resolves the chromedriver binary once per process, keeps a pre-warmed
+standby browser so restarts are a swap instead of a cold launch, and
+recycles the active browser when its measured memory (PSS) grows too large.
+"""
+import os
+import threading
+import logging
+
+os.environ["WDM_SSL_VERIFY"] = "0"
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+import config
+from load_profile import LoadProfile
+
+logger = logging.getLogger(__name__)
+
+PAGE_LOAD_TIMEOUT = 30
+STANDBY_WAIT_SECONDS = 60
+RECYCLE_GROWTH_MB = 50  # a fresh browser already over the limit must grow this much first
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def resolve_driver_path():
+    """Return the chromedriver path, resolving it only on first use."""
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            _driver_path = config.CHROMEDRIVER_PATH or ChromeDriverManager().install()
+            logger.info(f"Using chromedriver at {_driver_path}")
+        return _driver_path
+
+
+def launch_driver(load_profile):
+    opts = Options()
+    opts.add_argument("--headless")
+    opts.add_argument("--no-sandbox")
+    opts.add_argument("--disable-dev-shm-usage")
+    opts.add_argument("--disable-gpu")
+    opts.add_argument("--window-size=1280,720")
+    opts.add_argument("--lang=he")
+    opts.add_argument("--ignore-certificate-errors")
+    load_profile.configure_options(opts)
+    service = Service(resolve_driver_path())
+    driver = webdriver.Chrome(service=service, options=opts)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+    load_profile.apply(driver)
+    return driver
+
+
+def quit_driver(driver):
+    if driver is None:
+        return
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+def driver_alive(driver):
+    """True if the browser still answers; a page-load timeout leaves it alive."""
+    try:
+        if driver.service.process.poll() is not None:
+            return False
+        driver.execute_script("return 1")
+        return True
+    except Exception:
+        return False
+
+
+def _proc_pss_kb(pid, page_kb):
+    """PSS from smaps_rollup, so pages shared between Chrome processes count once."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    # Kernels before 4.14 have no smaps_rollup; fall back to RSS
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * page_kb
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def process_tree_pss_mb(root_pid):
+    """Sum proportional memory of a process and all its descendants (Linux only)."""
+    try:
+        entries = os.listdir("/proc")
+        page_kb = os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return None
+
+    children = {}
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    found = False
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        pss = _proc_pss_kb(pid, page_kb)
+        if pss is not None:
+            total += pss
+            found = True
+        stack.extend(children.get(pid, []))
+    return total / 1024 if found else None
+
+
+def _driver_pss_mb(driver):
+    try:
+        pid = driver.service.process.pid
+    except AttributeError:
+        return None
+    return process_tree_pss_mb(pid)
+
+
+class DriverPool:
+    """Owns the active browser plus an optional warm standby."""
+
+    def __init__(self, load_profile=None, warm_standby=True, max_rss_mb=0):
+        self.load_profile = load_profile or LoadProfile()
+        self.warm_standby = warm_standby
+        self.max_rss_mb = max_rss_mb
+
+        self._lock = threading.Lock()
+        self._active = None
+        self._standby = None
+        self._warm_thread = None
+        self._baseline_mb = None  # active browser's PSS when first measured
+
+    def acquire(self):
+        """Return the active driver, launching or promoting one if needed."""
+        with self._lock:
+            if self._active is None:
+                standby = self._take_standby()
+                if standby is not None and not driver_alive(standby):
+                    logger.warning("Standby Chrome WebDriver died while idle, discarding it")
+                    quit_driver(standby)
+                    standby = None
+                if standby is not None:
+                    # Pick up hosts learned while the standby sat idle
+                    self.load_profile.apply(standby)
+                self._active = standby or launch_driver(self.load_profile)
+                self._baseline_mb = None
+                logger.info("Chrome WebDriver initialized")
+                self._start_warming()
+            return self._active
+
+    def recycle(self, reason):
+        """Replace the active browser, preferring the pre-warmed standby."""
+        logger.info(f"Recycling Chrome WebDriver ({reason})")
+        with self._lock:
+            old = self._active
+            self._active = None
+        quit_driver(old)
+        return self.acquire()
+
+    def recycle_if_bloated(self):
+        """
+        Recycle the active browser when its PSS exceeds max_rss_mb. The
+        standby is not counted: it is idle and its size does not grow. A
+        browser that is over the limit when first measured is only recycled
+        once it has grown RECYCLE_GROWTH_MB past that, so a limit set too
+        low cannot make every cycle relaunch Chrome.
+        """
+        if not self.max_rss_mb:
+            return False
+        with self._lock:
+            driver = self._active
+        if driver is None:
+            return False
+        pss = _driver_pss_mb(driver)
+        if pss is None:
+            return False
+        with self._lock:
+            if self._active is not driver:
+                return False
+            if self._baseline_mb is None:
+                self._baseline_mb = pss
+                if pss > self.max_rss_mb:
+                    logger.warning(
+                        f"Fresh Chrome WebDriver already uses {pss:.0f} MB, over the "
+                        f"{self.max_rss_mb} MB limit; BROWSER_MAX_RSS_MB may be too low"
+                    )
+            threshold = max(self.max_rss_mb, self._baseline_mb + RECYCLE_GROWTH_MB)
+        if pss <= threshold:
+            return False
+        self.recycle(f"PSS {pss:.0f} MB > {threshold:.0f} MB")
+        return True
+
+    def close(self):
+        with self._lock:
+            thread = self._warm_thread
+        if thread:
+            thread.join(timeout=STANDBY_WAIT_SECONDS)
+        with self._lock:
+            drivers = [self._active, self._standby]
+            self._active = None
+            self._standby = None
+        for driver in drivers:
+            quit_driver(driver)
+
+    def _take_standby(self):
+        # Caller holds self._lock; wait briefly for an in-flight warm-up
+        thread = self._warm_thread
+        if thread and thread.is_alive():
+            self._lock.release()
+            try:
+                thread.join(timeout=STANDBY_WAIT_SECONDS)
+            finally:
+                self._lock.acquire()
+        driver, self._standby = self._standby, None
+        return driver
+
+    def _start_warming(self):
+        # Caller holds self._lock
+        if not self.warm_standby or self._standby is not None:
+            return
+        if self._warm_thread and self._warm_thread.is_alive():
+            return
+        self._warm_thread = threading.Thread(target=self._warm, daemon=True)
+        self._warm_thread.start()
+
+    def _warm(self):
+        try:
+            driver = launch_driver(self.load_profile)
+        except Exception as e:
+            logger.error(f"Error warming standby browser: {e}")
+            return
+        with self._lock:
+            if self._standby is None:
+                self._standby = driver
+                driver = None
+        quit_driver(driver)
+        logger.info("Standby Chrome WebDriver ready")
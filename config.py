@@ -9,7 +9,8 @@ def now_il():
     """Return current datetime in Israel timezone."""
     return datetime.now(IL_TZ)
 
-# --- Station Definitions (fixed list) ---
+# --- Station Definitions (used when neither STATIONS_FILE nor DATABASE_URL is set;
+# also seeds a newly created stations table) ---
 STATIONS = [
     {
         "id": "maagal60a",
@@ -49,9 +50,21 @@ STATIONS = [
     },
 ]
 
+STATIONS_FILE = os.environ.get("STATIONS_FILE", "")  # JSON list of station dicts
+STATIONS_RELOAD_INTERVAL = int(os.environ.get("STATIONS_RELOAD_INTERVAL", "30"))  # seconds
+
 # --- Scraping ---
 CHECK_INTERVAL = int(os.environ.get("CHECK_INTERVAL", "40"))  # seconds
 
+# --- Browser ---
+CHROMEDRIVER_PATH = os.environ.get("CHROMEDRIVER_PATH", "")  # skips webdriver-manager lookup
+# An idle standby on about:blank costs ~100 MB PSS, so the active browser's
+# default cap leaves room for it within 512 MB. Disable the standby to raise the cap.
+BROWSER_WARM_STANDBY = os.environ.get("BROWSER_WARM_STANDBY", "true").lower() == "true"
+BROWSER_MAX_RSS_MB = int(os.environ.get("BROWSER_MAX_RSS_MB", "300"))  # active browser's PSS; 0 disables recycling
+LOAD_PROFILE = os.environ.get("LOAD_PROFILE", "lean")  # full | lean | minimal
+LOAD_ALLOW_HOSTS = os.environ.get("LOAD_ALLOW_HOSTS", "afconev.co.il")  # comma-separated, used by "minimal"
+
 # --- Email (SMTP) ---
 SMTP_ENABLED = os.environ.get("SMTP_ENABLED", "false").lower() == "true"
 SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
@@ -63,6 +76,7 @@ SMTP_TO = os.environ.get("SMTP_TO", "")  # comma-separated
 
 # --- Database ---
 DATABASE_URL = os.environ.get("DATABASE_URL", "")
+HISTORY_RETENTION_DAYS = int(os.environ.get("HISTORY_RETENTION_DAYS", "90"))  # 0 keeps transitions forever
 
 # --- Flask ---
 SECRET_KEY = os.environ.get("SECRET_KEY", "ev-charger-monitor-secret")
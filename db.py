@@ -28,12 +28,15 @@ def get_conn(database_url):
         return None
 
 
-def init_tables(database_url):
+def init_tables(database_url, seed_stations=()):
+    """Create tables; a newly created stations table is filled from seed_stations."""
     conn = get_conn(database_url)
     if not conn:
         return False
     try:
         with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('stations')")
+            stations_exists = cur.fetchone()[0] is not None
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS scraper_state (
                     station_id TEXT PRIMARY KEY,
@@ -61,10 +64,34 @@ def init_tables(database_url):
                     timestamp TEXT
                 )
             """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS stations (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    name_he TEXT,
+                    address TEXT,
+                    url TEXT NOT NULL,
+                    lat DOUBLE PRECISION,
+                    lng DOUBLE PRECISION,
+                    site TEXT,
+                    provider TEXT
+                )
+            """)
+            if not stations_exists:
+                for st in seed_stations:
+                    cur.execute("""
+                        INSERT INTO stations (id, name, name_he, address, url, lat, lng)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    """, (st["id"], st["name"], st.get("name_he"), st.get("address"),
+                          st["url"], st.get("lat"), st.get("lng")))
             cur.execute("""
                 CREATE INDEX IF NOT EXISTS idx_timeline_ts
                 ON timeline_checks (timestamp)
             """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_history_ts
+                ON status_history (timestamp)
+            """)
         logger.info("Database tables initialized")
         return True
     except Exception as e:
@@ -118,18 +145,22 @@ def load_statuses(database_url):
 
 
 def save_history_event(database_url, event):
+    """Insert a transition and return its id, which doubles as its sequence number."""
     conn = get_conn(database_url)
     if not conn:
-        return
+        return None
     try:
         with conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO status_history (station_id, station_name, old_status, new_status, timestamp)
                 VALUES (%s, %s, %s, %s, %s)
+                RETURNING id
             """, (event["station_id"], event["station_name"],
                   event["old_status"], event["new_status"], event["timestamp"]))
+            return cur.fetchone()[0]
     except Exception as e:
         logger.error(f"Error saving history event: {e}")
+        return None
 
 
 def load_history(database_url, limit=200):
@@ -139,7 +170,7 @@ def load_history(database_url, limit=200):
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(
-                "SELECT station_id, station_name, old_status, new_status, timestamp "
+                "SELECT id AS seq, station_id, station_name, old_status, new_status, timestamp "
                 "FROM status_history ORDER BY id DESC LIMIT %s", (limit,))
             rows = cur.fetchall()
         return list(reversed(rows))
@@ -148,6 +179,82 @@ def load_history(database_url, limit=200):
         return []
 
 
+def load_history_since(database_url, cursor, limit=500):
+    """Return rows with id > cursor, or None if the table could not be read."""
+    conn = get_conn(database_url)
+    if not conn:
+        return None
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(
+                "SELECT id AS seq, station_id, station_name, old_status, new_status, timestamp "
+                "FROM status_history WHERE id > %s ORDER BY id LIMIT %s", (cursor, limit))
+            return cur.fetchall()
+    except Exception as e:
+        logger.error(f"Error loading history since {cursor}: {e}")
+        return None
+
+
+def last_history_id(database_url):
+    conn = get_conn(database_url)
+    if not conn:
+        return 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM status_history")
+            return cur.fetchone()[0]
+    except Exception as e:
+        logger.error(f"Error reading last history id: {e}")
+        return 0
+
+
+def connect_export(database_url):
+    """Open a dedicated connection for a long export. Raises on failure."""
+    return psycopg2.connect(database_url, sslmode="require")
+
+
+def iter_history_range(conn, start_iso, end_iso, itersize=5000):
+    """
+    Yield status_history rows with start <= timestamp < end through a
+    server-side cursor, so large ranges are fetched itersize rows at a
+    time instead of loaded into memory. Closes conn when done. Errors are
+    re-raised so a streaming response aborts instead of ending cleanly.
+    """
+    try:
+        with conn.cursor(name="history_export", cursor_factory=RealDictCursor) as cur:
+            cur.itersize = itersize
+            cur.execute(
+                "SELECT id AS seq, station_id, station_name, old_status, new_status, timestamp "
+                "FROM status_history WHERE timestamp >= %s AND timestamp < %s ORDER BY id",
+                (start_iso, end_iso))
+            for row in cur:
+                yield row
+    except Exception as e:
+        logger.error(f"Error exporting history: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+# --- Station registry ---
+
+def load_stations(database_url):
+    """Return all station rows, or None if the table could not be read."""
+    conn = get_conn(database_url)
+    if not conn:
+        return None
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(
+                "SELECT id, name, name_he, address, url, lat, lng, site, provider "
+                "FROM stations ORDER BY id")
+            rows = cur.fetchall()
+        return [{k: v for k, v in r.items() if v is not None} for r in rows]
+    except Exception as e:
+        logger.error(f"Error loading stations: {e}")
+        return None
+
+
 # --- Timeline checks ---
 
 def save_timeline_checks(database_url, checks):
@@ -192,17 +299,12 @@ def prune_timeline(database_url, cutoff_iso):
         logger.error(f"Error pruning timeline: {e}")
 
 
-def prune_history(database_url, max_rows=200):
+def prune_history(database_url, cutoff_iso):
     conn = get_conn(database_url)
     if not conn:
         return
     try:
         with conn.cursor() as cur:
-            cur.execute("""
-                DELETE FROM status_history
-                WHERE id NOT IN (
-                    SELECT id FROM status_history ORDER BY id DESC LIMIT %s
-                )
-            """, (max_rows,))
+            cur.execute("DELETE FROM status_history WHERE timestamp < %s", (cutoff_iso,))
     except Exception as e:
         logger.error(f"Error pruning history: {e}")
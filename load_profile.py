@@ -0,0 +1,212 @@
+"""
+Network load profiles for station page loads.
+A profile decides which requests Chrome may make while rendering a
+charger page (via CDP Network.setBlockedURLs) and tallies, per check,
+how many requests and bytes were loaded and how many were saved.
+"""
+import json
+import threading
+import logging
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+FONT_PATTERNS = ["*.woff", "*.woff2", "*.ttf", "*.otf"]
+TRACKER_PATTERNS = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*facebook.net*",
+    "*hotjar.com*",
+]
+MEDIA_PATTERNS = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.mp4"]
+
+# "full" loads everything, "lean" drops images, fonts and trackers, and
+# "minimal" additionally blocks every host outside the allowlist. Images
+# are blocked by URL pattern rather than Chrome prefs so that they still
+# show up as blocked requests in the performance log.
+PROFILES = {
+    "full": {"block": [], "allowlist": False},
+    "lean": {"block": FONT_PATTERNS + TRACKER_PATTERNS + MEDIA_PATTERNS, "allowlist": False},
+    "minimal": {"block": FONT_PATTERNS + TRACKER_PATTERNS + MEDIA_PATTERNS, "allowlist": True},
+}
+
+MAX_SEEN_SIZES = 1000
+CALIBRATION_EVERY = 50  # every Nth load runs unblocked to learn what blocking saves
+PROBATION_MISSES = 3  # consecutive status-less loads before probation hosts are unblocked
+REQUIRED_RETRY_LOADS = 10 * CALIBRATION_EVERY  # how long a required host stays exempt
+
+
+class LoadProfile:
+    """
+    setBlockedURLs only takes block patterns, so the host allowlist is
+    enforced by learning: any host outside it that shows up in a page load
+    gets its own block pattern. Newly learned hosts are on probation until a
+    load renders a charger status; if PROBATION_MISSES loads in a row do not,
+    their patterns are dropped and the hosts are treated as required. A
+    required host is exempt for REQUIRED_RETRY_LOADS loads, after which the
+    next calibration load puts it back on probation.
+
+    Blocked requests never report a size, so the first load and every
+    CALIBRATION_EVERY-th load after it run unblocked. The sizes they record
+    are what later blocked requests count as bytes saved.
+    """
+
+    def __init__(self, name="lean", allow_hosts=()):
+        if name not in PROFILES:
+            logger.warning(f"Unknown load profile '{name}', using 'lean'")
+            name = "lean"
+        self.name = name
+        self._spec = PROFILES[name]
+        self.allow_hosts = [h.lower() for h in allow_hosts if h]
+
+        self._lock = threading.Lock()
+        self._learned = []
+        self._probation = []  # learned hosts not yet proven safe to block
+        self._probation_misses = 0
+        self._required = {}  # foreign host the status depended on -> load it was marked at
+        self._seen_sizes = OrderedDict()  # url without query -> encoded bytes, LRU order
+        self._loads = 0
+        self._calibrating = False
+
+    def configure_options(self, opts):
+        opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+    def blocked_patterns(self):
+        with self._lock:
+            return self._spec["block"] + self._learned
+
+    def apply(self, driver):
+        """Install the current blocklist on a driver."""
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.blocked_patterns()})
+        except Exception as e:
+            logger.warning(f"Could not install URL blocklist: {e}")
+
+    def prepare(self, driver):
+        """Call before each page load; lifts the blocklist for calibration loads."""
+        with self._lock:
+            # A calibration load that failed before collect() left the blocklist lifted
+            stale = self._calibrating
+            self._loads += 1
+            self._calibrating = bool(self._spec["block"]) and self._loads % CALIBRATION_EVERY == 1
+            calibrating = self._calibrating
+        if calibrating:
+            try:
+                driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": []})
+            except Exception as e:
+                logger.warning(f"Could not lift URL blocklist for calibration: {e}")
+        elif stale:
+            self.apply(driver)
+        return calibrating
+
+    def collect(self, driver, status_found=True):
+        """
+        Drain the driver's performance log and summarize the last page load.
+        status_found says whether the page rendered a charger status.
+        """
+        reverted = []
+        with self._lock:
+            calibrating, self._calibrating = self._calibrating, False
+            if self._probation and not calibrating:
+                if status_found:
+                    self._probation = []
+                    self._probation_misses = 0
+                else:
+                    self._probation_misses += 1
+                if self._probation_misses >= PROBATION_MISSES:
+                    reverted = self._probation
+                    self._required.update((h, self._loads) for h in reverted)
+                    self._learned = [p for p in self._learned
+                                     if p not in {f"*://{h}/*" for h in reverted}]
+                    self._probation = []
+                    self._probation_misses = 0
+            if calibrating:
+                # Let long-required hosts be relearned from this unblocked load
+                self._required = {h: n for h, n in self._required.items()
+                                  if self._loads - n < REQUIRED_RETRY_LOADS}
+        if reverted:
+            logger.warning(
+                f"Status missing for {PROBATION_MISSES} loads after blocking; "
+                f"unblocking {', '.join(reverted)}"
+            )
+        if calibrating or reverted:
+            self.apply(driver)
+        try:
+            entries = driver.get_log("performance")
+        except Exception as e:
+            logger.debug(f"Performance log unavailable: {e}")
+            return None
+
+        urls = {}
+        loaded = {}
+        blocked = set()
+        for entry in entries:
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, TypeError, ValueError):
+                continue
+            method = message.get("method")
+            params = message.get("params", {})
+            if method == "Network.requestWillBeSent":
+                urls[params["requestId"]] = params["request"]["url"]
+            elif method == "Network.loadingFinished":
+                loaded[params["requestId"]] = params.get("encodedDataLength", 0)
+            elif method == "Network.loadingFailed" and params.get("blockedReason"):
+                blocked.add(params["requestId"])
+
+        new_hosts = set()
+        requests = 0
+        bytes_saved = 0
+        with self._lock:
+            for request_id, url in urls.items():
+                key = url.split("?", 1)[0]
+                if request_id in blocked:
+                    if key in self._seen_sizes:
+                        bytes_saved += self._seen_sizes[key]
+                        self._seen_sizes.move_to_end(key)
+                    continue
+                requests += 1
+                if request_id in loaded:
+                    self._seen_sizes[key] = loaded[request_id]
+                    self._seen_sizes.move_to_end(key)
+                    if len(self._seen_sizes) > MAX_SEEN_SIZES:
+                        self._seen_sizes.popitem(last=False)
+                host = self._foreign_host(url)
+                if host:
+                    new_hosts.add(host)
+            if reverted:
+                new_hosts = set()  # let the unblocked hosts prove themselves first
+            for host in sorted(new_hosts):
+                self._learned.append(f"*://{host}/*")
+            self._probation.extend(sorted(new_hosts))
+
+        if new_hosts:
+            logger.info(f"Blocking non-allowlisted hosts: {', '.join(sorted(new_hosts))}")
+            self.apply(driver)
+
+        return {
+            "requests": requests,
+            "requests_blocked": len(blocked),
+            "bytes_loaded": sum(loaded.values()),
+            "bytes_saved": bytes_saved,
+            "calibration": calibrating,
+        }
+
+    def _foreign_host(self, url):
+        # Caller holds self._lock
+        if not self._spec["allowlist"] or not self.allow_hosts:
+            return None
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            return None
+        host = (parts.hostname or "").lower()
+        if not host or host in self._required:
+            return None
+        if any(host == h or host.endswith("." + h) for h in self.allow_hosts):
+            return None
+        if f"*://{host}/*" in self._learned:
+            return None
+        return host
@@ -0,0 +1,129 @@
+"""
+Nearest-charger queries.
+Mirrors live statuses from the scraper into a SpatialGrid of available
+stations, learns typical session lengths from in_use -> available
+transitions, and ranks nearby stations by distance and predicted wait.
+"""
+import threading
+import logging
+from datetime import datetime
+
+from config import now_il
+from stations import SpatialGrid, has_coords
+
+logger = logging.getLogger(__name__)
+
+DRIVE_SPEED_KMH = 30
+DEFAULT_SESSION_MINUTES = 60
+MIN_WAIT_MINUTES = 5  # an overdue session still needs a little time to wrap up
+MAX_SESSION_MINUTES = 24 * 60
+SESSION_EWMA_ALPHA = 0.3
+CANDIDATE_FACTOR = 4
+
+
+def _minutes_between(start_iso, end_iso):
+    try:
+        start = datetime.fromisoformat(start_iso)
+        end = datetime.fromisoformat(end_iso)
+    except (TypeError, ValueError):
+        return None
+    return (end - start).total_seconds() / 60
+
+
+class NearbyIndex:
+    def __init__(self, registry):
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._available = SpatialGrid()
+        self._live = {}  # station_id -> {"status", "in_use_since"}
+        self._session_minutes = {}  # station_id -> EWMA of completed sessions
+        self._global_session_minutes = None
+
+    def load(self, statuses):
+        """Seed from StationScraper.get_all_statuses()."""
+        for sid, info in statuses.items():
+            self.update(sid, info.get("status"), info.get("last_check"), info.get("in_use_since"))
+        logger.info(f"Nearby index seeded: {len(self._available)} available stations")
+
+    def update(self, station_id, status, timestamp, in_use_since=None):
+        station = self.registry.get(station_id)
+        with self._lock:
+            prev = self._live.get(station_id)
+            if prev and prev["status"] == "in_use" and status == "available":
+                self._record_session(station_id, prev["in_use_since"], timestamp)
+            self._live[station_id] = {"status": status, "in_use_since": in_use_since}
+            if station and status == "available" and has_coords(station):
+                self._available.add(station_id, station["lat"], station["lng"], station_id)
+            else:
+                self._available.remove(station_id)
+
+    def query(self, lat, lng, k=5, available_only=False, max_km=None):
+        """
+        Return up to k nearby stations. With available_only they are ranked
+        by distance; otherwise by ETA, the later of drive time and predicted
+        wait, over the k nearest available plus the CANDIDATE_FACTOR * k
+        nearest stations of any status.
+        """
+        with self._lock:
+            hits = self._available.nearest(
+                lat, lng, k=k, max_km=max_km,
+                predicate=lambda sid: self.registry.get(sid) is not None,
+            )
+        if not available_only:
+            hits += [(d, s["id"]) for d, s in
+                     self.registry.nearest(lat, lng, k=k * CANDIDATE_FACTOR, max_km=max_km)]
+
+        now = now_il()
+        results = {}
+        with self._lock:
+            for d, sid in hits:
+                station = self.registry.get(sid)
+                if station is None or sid in results:
+                    continue
+                live = self._live.get(sid, {})
+                wait = self._predicted_wait(sid, live, now)
+                drive = d / DRIVE_SPEED_KMH * 60
+                results[sid] = {
+                    "id": sid,
+                    "name": station["name"],
+                    "name_he": station.get("name_he"),
+                    "address": station.get("address"),
+                    "lat": station.get("lat"),
+                    "lng": station.get("lng"),
+                    "status": live.get("status"),
+                    "distance_km": round(d, 3),
+                    "predicted_wait_min": None if wait is None else round(wait, 1),
+                    "eta_min": None if wait is None else round(max(drive, wait), 1),
+                }
+
+        ranked = list(results.values())
+        if available_only:
+            ranked.sort(key=lambda r: r["distance_km"])
+        else:
+            ranked.sort(key=lambda r: (r["eta_min"] is None, r["eta_min"] or 0, r["distance_km"]))
+        return ranked[:k]
+
+    def _predicted_wait(self, station_id, live, now):
+        # Caller holds self._lock
+        status = live.get("status")
+        if status == "available":
+            return 0.0
+        if status != "in_use":
+            return None
+        typical = (self._session_minutes.get(station_id)
+                   or self._global_session_minutes
+                   or DEFAULT_SESSION_MINUTES)
+        elapsed = _minutes_between(live.get("in_use_since"), now.isoformat()) or 0
+        return max(MIN_WAIT_MINUTES, typical - elapsed)
+
+    def _record_session(self, station_id, start_iso, end_iso):
+        # Caller holds self._lock
+        minutes = _minutes_between(start_iso, end_iso)
+        if minutes is None or not 0 < minutes <= MAX_SESSION_MINUTES:
+            return
+        old = self._session_minutes.get(station_id)
+        self._session_minutes[station_id] = minutes if old is None else (
+            SESSION_EWMA_ALPHA * minutes + (1 - SESSION_EWMA_ALPHA) * old)
+        old = self._global_session_minutes
+        self._global_session_minutes = minutes if old is None else (
+            SESSION_EWMA_ALPHA * minutes + (1 - SESSION_EWMA_ALPHA) * old)
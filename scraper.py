@@ -3,16 +3,14 @@ import os
 import threading
 import time
 import logging
+from collections import deque
 
-os.environ["WDM_SSL_VERIFY"] = "0"
-
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.common.exceptions import WebDriverException
-from webdriver_manager.chrome import ChromeDriverManager
 
 import config
+from browser import DriverPool, driver_alive
+from load_profile import LoadProfile
+from transitions import TransitionLog
 from config import now_il
 import db
 
@@ -22,24 +20,35 @@ STATE_FILE = os.environ.get("SCRAPER_STATE_FILE", "scraper_state.json")
 
 
 class StationScraper:
-    def __init__(self, stations, check_interval, on_status_change, on_station_checked=None, on_cycle_complete=None):
-        self.stations = stations
+    def __init__(self, registry, check_interval, on_status_change, on_station_checked=None, on_cycle_complete=None,
+                 transition_log=None):
+        self.registry = registry
         self.check_interval = check_interval
         self.on_status_change = on_status_change
         self.on_station_checked = on_station_checked
         self.on_cycle_complete = on_cycle_complete
         self._db_url = config.DATABASE_URL
+        self._transitions = transition_log or TransitionLog()
 
         self._lock = threading.Lock()
         self._statuses = {}
         self._in_use_since = {}
         self._history = []
         self._running = False
-        self._driver = None
+        self._load_stats = {}
+        self._pool = DriverPool(
+            load_profile=LoadProfile(
+                config.LOAD_PROFILE,
+                allow_hosts=[h.strip() for h in config.LOAD_ALLOW_HOSTS.split(",")],
+            ),
+            warm_standby=config.BROWSER_WARM_STANDBY,
+            max_rss_mb=config.BROWSER_MAX_RSS_MB,
+        )
         self._thread = None
         self._cycle_count = 0
 
         self._load_state()
+        self._forget([sid for sid in self._statuses if registry.get(sid) is None])
 
     def start(self):
         self._running = True
@@ -49,16 +58,19 @@ class StationScraper:
 
     def stop(self):
         self._running = False
-        if self._driver:
-            try:
-                self._driver.quit()
-            except Exception:
-                pass
+        self._pool.close()
 
     def get_all_statuses(self):
         with self._lock:
             return dict(self._statuses)
 
+    def get_load_stats(self):
+        with self._lock:
+            return {
+                "profile": self._pool.load_profile.name,
+                "stations": dict(self._load_stats),
+            }
+
     def get_history(self, limit=50):
         with self._lock:
             return list(self._history[-limit:])
@@ -95,7 +107,7 @@ class StationScraper:
         """Persist current statuses, in_use_since, and history."""
         if self._db_url:
             db.save_statuses(self._db_url, self._statuses, self._in_use_since)
-            db.prune_history(self._db_url)
+            self._transitions.prune()
             return
         try:
             data = {
@@ -108,50 +120,92 @@ class StationScraper:
         except Exception as e:
             logger.error(f"Error saving scraper state: {e}")
 
-    def _init_driver(self):
-        opts = Options()
-        opts.add_argument("--headless")
-        opts.add_argument("--no-sandbox")
-        opts.add_argument("--disable-dev-shm-usage")
-        opts.add_argument("--disable-gpu")
-        opts.add_argument("--window-size=1280,720")
-        opts.add_argument("--lang=he")
-        opts.add_argument("--ignore-certificate-errors")
-        service = Service(ChromeDriverManager().install())
-        self._driver = webdriver.Chrome(service=service, options=opts)
-        self._driver.set_page_load_timeout(30)
-        logger.info("Chrome WebDriver initialized")
-
     def _check_station(self, station):
+        driver = None
         try:
-            self._driver.get(station["url"])
+            driver = self._pool.acquire()
+            self._pool.load_profile.prepare(driver)
+            driver.get(station["url"])
             time.sleep(10)
-            source = self._driver.page_source
+            source = driver.page_source
 
             # Skip button elements that may contain status text
-            lines = source.split("\n")
-            for line in lines:
+            status = "unknown"
+            for line in source.split("\n"):
                 stripped = line.strip()
                 if '<button tabindex="-1"' in stripped:
                     continue
                 if "Available to charge" in stripped or "\u05d6\u05de\u05d9\u05df \u05dc\u05d8\u05e2\u05d9\u05e0\u05d4" in stripped:
-                    return "available"
+                    status = "available"
+                    break
                 if "In Use" in stripped or "\u05d1\u05e9\u05d9\u05de\u05d5\u05e9" in stripped:
-                    return "in_use"
+                    status = "in_use"
+                    break
 
-            return "unknown"
+            self._record_load_stats(station, driver, status)
+            return status
+        except WebDriverException as e:
+            logger.error(f"Error checking {station['id']}: {e}")
+            if driver is None or not driver_alive(driver):
+                try:
+                    self._pool.recycle("crash")
+                except Exception as e:
+                    logger.error(f"Error restarting WebDriver: {e}")
+            return "error"
         except Exception as e:
             logger.error(f"Error checking {station['id']}: {e}")
             return "error"
 
+    def _record_load_stats(self, station, driver, status):
+        stats = self._pool.load_profile.collect(driver, status_found=status != "unknown")
+        if stats is None:
+            return
+        with self._lock:
+            self._load_stats[station["id"]] = stats
+        logger.info(
+            f"{station['id']} page load{' (calibration)' if stats['calibration'] else ''}: "
+            f"{stats['requests']} requests, "
+            f"{stats['bytes_loaded'] // 1024} KB; saved {stats['requests_blocked']} "
+            f"requests, {stats['bytes_saved'] // 1024} KB"
+        )
+
+    def _forget(self, station_ids):
+        with self._lock:
+            for sid in station_ids:
+                self._statuses.pop(sid, None)
+                self._in_use_since.pop(sid, None)
+                self._load_stats.pop(sid, None)
+
+    def _reschedule(self, changes, pending):
+        """Drop removed stations and move added/changed ones to the front of the pass."""
+        self._forget(changes["removed"])
+        moved = set(changes["added"]) | set(changes["changed"]) | set(changes["removed"])
+        kept = [sid for sid in pending if sid not in moved]
+        pending.clear()
+        pending.extend(changes["added"] + changes["changed"])
+        pending.extend(kept)
+
     def _loop(self):
-        self._init_driver()
+        self._pool.acquire()
 
         while self._running:
             try:
-                for station in self.stations:
-                    if not self._running:
-                        break
+                # Also reload here so an empty registry can pick up stations later
+                changes = self.registry.refresh()
+                if changes:
+                    self._forget(changes["removed"])
+                pending = deque(self.registry.ids())
+                while pending and self._running:
+                    # Hot reload: only added or changed stations are rescheduled
+                    changes = self.registry.refresh()
+                    if changes:
+                        self._reschedule(changes, pending)
+                        if not pending:
+                            break
+
+                    station = self.registry.get(pending.popleft())
+                    if station is None:
+                        continue
 
                     new_status = self._check_station(station)
                     now = now_il().isoformat()
@@ -180,11 +234,10 @@ class StationScraper:
                                 "new_status": new_status,
                                 "timestamp": now,
                             }
+                            event["seq"] = self._transitions.append(event)
                             self._history.append(event)
                             if len(self._history) > 200:
                                 self._history = self._history[-200:]
-                            if self._db_url:
-                                db.save_history_event(self._db_url, event)
 
                     # Always notify UI of the latest check time
                     if self.on_station_checked:
@@ -212,22 +265,12 @@ class StationScraper:
                 if self.on_cycle_complete:
                     self.on_cycle_complete(self.check_interval)
 
-                # Proactive driver restart every 100 cycles to prevent memory leaks
-                if self._cycle_count % 100 == 0:
-                    logger.info("Proactive driver restart for memory management")
-                    try:
-                        self._driver.quit()
-                    except Exception:
-                        pass
-                    self._init_driver()
+                # Swap in the standby browser once Chrome's memory grows too large
+                self._pool.recycle_if_bloated()
 
             except WebDriverException as e:
                 logger.error(f"WebDriver crashed: {e}, reinitializing...")
-                try:
-                    self._driver.quit()
-                except Exception:
-                    pass
-                self._init_driver()
+                self._pool.recycle("crash")
             except Exception as e:
                 logger.error(f"Unexpected error in scraper loop: {e}")
 
@@ -237,8 +280,4 @@ class StationScraper:
                     break
                 time.sleep(1)
 
-        if self._driver:
-            try:
-                self._driver.quit()
-            except Exception:
-                pass
+        self._pool.close()
@@ -0,0 +1,261 @@
+"""
+Station registry: the set of stations the scraper monitors.
+Loads from a JSON file (STATIONS_FILE) or the `stations` table, or from
+config.STATIONS when neither is configured. Lookups by id are dict-backed, a uniform
+lat/lng grid (SpatialGrid) answers nearest-station queries, and refresh()
+hot-reloads the source and reports which stations were added, removed
+or changed.
+"""
+import heapq
+import json
+import math
+import os
+import threading
+import time
+import logging
+
+import config
+import db
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ("id", "name", "url")
+GRID_CELL_DEG = 0.05  # ~5.5 km of latitude per cell
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle (haversine) distance in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def _cell(lat, lng):
+    return (math.floor(lat / GRID_CELL_DEG), math.floor(lng / GRID_CELL_DEG))
+
+
+def has_coords(station):
+    return isinstance(station.get("lat"), (int, float)) and isinstance(station.get("lng"), (int, float))
+
+
+class SpatialGrid:
+    """
+    Uniform lat/lng grid for k-nearest queries. Not thread-safe; callers
+    either treat an instance as immutable or guard it with their own lock.
+    """
+
+    def __init__(self):
+        self._cells = {}  # cell -> {key: (lat, lng, value)}
+        self._where = {}  # key -> cell
+        self.bounds = None  # only ever grows, which keeps searches correct
+
+    def __len__(self):
+        return len(self._where)
+
+    def add(self, key, lat, lng, value):
+        self.remove(key)
+        cell = _cell(lat, lng)
+        self._cells.setdefault(cell, {})[key] = (lat, lng, value)
+        self._where[key] = cell
+        if self.bounds is None:
+            self.bounds = (cell[0], cell[0], cell[1], cell[1])
+        else:
+            min_row, max_row, min_col, max_col = self.bounds
+            self.bounds = (min(min_row, cell[0]), max(max_row, cell[0]),
+                           min(min_col, cell[1]), max(max_col, cell[1]))
+
+    def remove(self, key):
+        cell = self._where.pop(key, None)
+        if cell is None:
+            return
+        bucket = self._cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self._cells[cell]
+        if not self._where:
+            self.bounds = None
+
+    def nearest(self, lat, lng, k=5, predicate=None, max_km=None):
+        """
+        Return up to k (distance_km, value) pairs closest to (lat, lng),
+        searching grid rings outward until no closer item can remain.
+        """
+        if not self.bounds or k <= 0:
+            return []
+        row0, col0 = _cell(lat, lng)
+        min_row, max_row, min_col, max_col = self.bounds
+        max_ring = max(abs(row0 - min_row), abs(row0 - max_row),
+                       abs(col0 - min_col), abs(col0 - max_col))
+        # Rings that lie entirely outside the occupied bounds are empty
+        min_ring = max(0, min_row - row0, row0 - max_row, min_col - col0, col0 - max_col)
+
+        best = []  # max-heap of (-distance, key, value)
+
+        def consider(cells):
+            for cell in cells:
+                for key, (item_lat, item_lng, value) in self._cells.get(cell, {}).items():
+                    if predicate and not predicate(value):
+                        continue
+                    d = distance_km(lat, lng, item_lat, item_lng)
+                    if max_km is not None and d > max_km:
+                        continue
+                    item = (-d, key, value)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, item)
+
+        for ring in range(min_ring, max_ring + 1):
+            # Anything in this ring is at least (ring - 1) whole cells away
+            lat_bound = min(89.0, abs(lat) + ring * GRID_CELL_DEG)
+            gap_km = (ring - 1) * GRID_CELL_DEG * KM_PER_DEG * math.cos(math.radians(lat_bound))
+            if len(best) == k and gap_km > -best[0][0]:
+                break
+            if max_km is not None and gap_km > max_km:
+                break
+            if 8 * (ring - min_ring) > len(self._cells):
+                # Sparse grid: scanning the occupied cells beats walking empty rings
+                consider([c for c in self._cells
+                          if max(abs(c[0] - row0), abs(c[1] - col0)) >= ring])
+                break
+            consider(self._ring_cells(row0, col0, ring))
+        return [(-neg_d, value) for neg_d, _, value in sorted(best, reverse=True)]
+
+    def _ring_cells(self, row0, col0, ring):
+        """Cells at Chebyshev distance `ring` from (row0, col0), clipped to bounds."""
+        min_row, max_row, min_col, max_col = self.bounds
+        if ring == 0:
+            yield (row0, col0)
+            return
+        cols = range(max(col0 - ring, min_col), min(col0 + ring, max_col) + 1)
+        for row in (row0 - ring, row0 + ring):
+            if min_row <= row <= max_row:
+                for col in cols:
+                    yield (row, col)
+        rows = range(max(row0 - ring + 1, min_row), min(row0 + ring - 1, max_row) + 1)
+        for col in (col0 - ring, col0 + ring):
+            if min_col <= col <= max_col:
+                for row in rows:
+                    yield (row, col)
+
+
+class _Snapshot:
+    """Immutable view of one registry load; swapped wholesale on reload."""
+
+    def __init__(self, stations):
+        self.stations = stations
+        self.by_id = {s["id"]: s for s in stations}
+        self.grid = SpatialGrid()
+        for s in stations:
+            if has_coords(s):
+                self.grid.add(s["id"], s["lat"], s["lng"], s)
+
+
+class StationRegistry:
+    def __init__(self, filepath=config.STATIONS_FILE, reload_interval=config.STATIONS_RELOAD_INTERVAL):
+        self.filepath = filepath
+        self._db_url = config.DATABASE_URL
+        self.reload_interval = reload_interval
+
+        self._lock = threading.Lock()
+        self._file_mtime = None
+        self._last_refresh = time.monotonic()
+        self._snapshot = _Snapshot(self._load())
+        logger.info(f"Station registry loaded {len(self._snapshot.stations)} stations")
+
+    def all(self):
+        return list(self._snapshot.stations)
+
+    def ids(self):
+        return [s["id"] for s in self._snapshot.stations]
+
+    def get(self, station_id):
+        return self._snapshot.by_id.get(station_id)
+
+    def __len__(self):
+        return len(self._snapshot.stations)
+
+    def nearest(self, lat, lng, k=5, predicate=None, max_km=None):
+        """Return up to k (distance_km, station) pairs closest to (lat, lng)."""
+        return self._snapshot.grid.nearest(lat, lng, k=k, predicate=predicate, max_km=max_km)
+
+    def refresh(self, force=False):
+        """
+        Reload the source if it is due and has changed. Returns a dict of
+        added/removed/changed station ids, or None when nothing changed.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.reload_interval:
+            return None
+        self._last_refresh = now
+        with self._lock:
+            if not force and self._source_unchanged():
+                return None
+            stations = self._load()
+            old = self._snapshot.by_id
+            new = {s["id"]: s for s in stations}
+            changes = {
+                "added": [sid for sid in new if sid not in old],
+                "removed": [sid for sid in old if sid not in new],
+                "changed": [sid for sid in new if sid in old and new[sid] != old[sid]],
+            }
+            if not any(changes.values()):
+                return None
+            self._snapshot = _Snapshot(stations)
+        logger.info(
+            f"Station registry reloaded: {len(changes['added'])} added, "
+            f"{len(changes['removed'])} removed, {len(changes['changed'])} changed"
+        )
+        return changes
+
+    def _source_unchanged(self):
+        if not self.filepath:
+            return False
+        try:
+            return os.path.getmtime(self.filepath) == self._file_mtime
+        except OSError:
+            return False
+
+    def _load(self):
+        if not self.filepath and not self._db_url:
+            return self._validate(config.STATIONS)
+        if self.filepath:
+            stations = self._load_file()
+        else:
+            stations = db.load_stations(self._db_url)
+        if stations is None:
+            # Keep serving the last good load if the source is unreadable
+            snapshot = getattr(self, "_snapshot", None)
+            return snapshot.stations if snapshot is not None else []
+        return self._validate(stations)
+
+    def _load_file(self):
+        try:
+            mtime = os.path.getmtime(self.filepath)
+            with open(self.filepath, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._file_mtime = mtime
+        except Exception as e:
+            logger.error(f"Error loading stations file: {e}")
+            return None
+        if isinstance(data, dict):
+            data = data.get("stations", [])
+        return data
+
+    def _validate(self, stations):
+        valid = []
+        seen = set()
+        for s in stations:
+            if not isinstance(s, dict) or any(not s.get(f) for f in REQUIRED_FIELDS):
+                logger.warning(f"Skipping invalid station entry: {s!r}")
+                continue
+            if s["id"] in seen:
+                logger.warning(f"Skipping duplicate station id: {s['id']}")
+                continue
+            seen.add(s["id"])
+            valid.append(dict(s))
+        return valid
@@ -0,0 +1,332 @@
+"""
+Durable, sequence-numbered log of station status transitions.
+Backed by status_history (its SERIAL id is the sequence number) when
+DATABASE_URL is set, otherwise by an append-only NDJSON file. Readers
+resume from a cursor, the last sequence number they have seen, and bulk
+exports stream date ranges as gzip CSV or Parquet.
+"""
+import bisect
+import csv
+import io
+import json
+import os
+import threading
+import time
+import zlib
+import logging
+from datetime import datetime, timedelta
+
+import config
+from config import now_il
+import db
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+PARQUET_AVAILABLE = pq is not None
+
+logger = logging.getLogger(__name__)
+
+TRANSITIONS_FILE = os.environ.get("TRANSITIONS_FILE", "transitions.ndjson")
+EXPORT_FIELDS = ["seq", "station_id", "station_name", "old_status", "new_status", "timestamp"]
+OFFSET_STRIDE = 1000  # file mode: remember the byte offset of every Nth record
+PAGE_SIZE = 500
+HEARTBEAT_SECONDS = 15
+EXPORT_BATCH_ROWS = 5000
+
+
+class TransitionLog:
+    def __init__(self, filepath=TRANSITIONS_FILE):
+        self.filepath = filepath
+        self._db_url = config.DATABASE_URL
+        self._cond = threading.Condition()
+        self._offsets = []  # sorted (seq, byte offset) pairs, file mode only
+        self._last_seq = self._load()
+
+    @property
+    def last_seq(self):
+        with self._cond:
+            return self._last_seq
+
+    def append(self, event):
+        """Persist a transition and return its sequence number (None on failure)."""
+        if self._db_url:
+            seq = db.save_history_event(self._db_url, event)
+        else:
+            seq = self._append_file(event)
+        if seq is not None:
+            with self._cond:
+                self._last_seq = max(self._last_seq, seq)
+                self._cond.notify_all()
+        return seq
+
+    def read_since(self, cursor, limit=PAGE_SIZE):
+        """
+        Return up to limit transitions with seq > cursor, oldest first, or
+        None if the store could not be read.
+        """
+        if self._db_url:
+            rows = db.load_history_since(self._db_url, cursor, limit)
+            return None if rows is None else [dict(r) for r in rows]
+        try:
+            return self._read_file(cursor, limit)
+        except OSError as e:
+            logger.error(f"Error reading transitions: {e}")
+            return None
+
+    def wait(self, cursor, timeout):
+        """Block until a transition newer than cursor exists or timeout passes."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._last_seq > cursor, timeout)
+
+    def follow(self, cursor, follow=True):
+        """
+        Yield transitions after cursor. With follow, keep tailing the log
+        and yield None whenever HEARTBEAT_SECONDS pass without a new one.
+        Read failures back off rather than retrying in a tight loop; without
+        follow they raise so the response aborts instead of ending cleanly.
+        """
+        backoff = 1
+        while True:
+            batch = self.read_since(cursor)
+            if batch is None:
+                if not follow:
+                    raise RuntimeError("transition log could not be read")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, HEARTBEAT_SECONDS)
+                yield None
+                continue
+            for event in batch:
+                cursor = event["seq"]
+                yield event
+            if len(batch) == PAGE_SIZE:
+                continue
+            if not follow:
+                return
+            if not batch and self.last_seq > cursor:
+                # The log is ahead of anything readable, so wait() would
+                # return at once; poll slowly until the records show up
+                time.sleep(backoff)
+                backoff = min(backoff * 2, HEARTBEAT_SECONDS)
+                yield None
+                continue
+            backoff = 1
+            if not self.wait(cursor, HEARTBEAT_SECONDS):
+                yield None
+
+    def export(self, start_iso, end_iso):
+        """
+        Return an iterator over transitions with start <= timestamp < end,
+        oldest first. The DB connection is opened here, so an outage raises
+        before any response is started.
+        """
+        if self._db_url:
+            conn = db.connect_export(self._db_url)
+            return (dict(row) for row in db.iter_history_range(conn, start_iso, end_iso))
+        return (event for event in self._iter_file()
+                if start_iso <= event.get("timestamp", "") < end_iso)
+
+    def prune(self):
+        """Drop transitions older than HISTORY_RETENTION_DAYS (DB mode; files prune on load)."""
+        if not self._db_url or not config.HISTORY_RETENTION_DAYS:
+            return
+        db.prune_history(self._db_url, _retention_cutoff())
+
+    def _load(self):
+        if self._db_url:
+            return db.last_history_id(self._db_url)
+        if not os.path.exists(self.filepath):
+            return 0
+
+        # Rewrite the file without expired records and rebuild the offset index.
+        # The newest record is always kept, even if expired, since it is the
+        # only durable copy of the high-water mark and seqs must never repeat.
+        cutoff = _retention_cutoff() if config.HISTORY_RETENTION_DAYS else ""
+        last_seq = 0
+        kept = 0
+        expired = None  # newest expired (seq, line) seen since the last kept record
+        tmp_path = self.filepath + ".tmp"
+        try:
+            with open(self.filepath, "rb") as src, open(tmp_path, "wb") as dst:
+                for line in src:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    seq = event.get("seq", 0)
+                    last_seq = max(last_seq, seq)
+                    line = line if line.endswith(b"\n") else line + b"\n"
+                    if event.get("timestamp", "") < cutoff:
+                        expired = (seq, line)
+                        continue
+                    expired = None
+                    if kept % OFFSET_STRIDE == 0:
+                        self._offsets.append((seq, dst.tell()))
+                    dst.write(line)
+                    kept += 1
+                if expired is not None and expired[0] == last_seq:
+                    self._offsets.append((expired[0], dst.tell()))
+                    dst.write(expired[1])
+            os.replace(tmp_path, self.filepath)
+        except Exception as e:
+            logger.error(f"Error loading transitions: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self._offsets = []
+            return last_seq
+        logger.info(f"Loaded {kept} transitions (last seq {last_seq})")
+        return last_seq
+
+    def _append_file(self, event):
+        with self._cond:
+            seq = self._last_seq + 1
+            record = {"seq": seq, **{k: event.get(k) for k in EXPORT_FIELDS[1:]}}
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            try:
+                with open(self.filepath, "ab") as f:
+                    offset = f.tell()
+                    f.write(line)
+            except Exception as e:
+                logger.error(f"Error appending transition: {e}")
+                return None
+            if not self._offsets or seq - self._offsets[-1][0] >= OFFSET_STRIDE:
+                self._offsets.append((seq, offset))
+            return seq
+
+    def _read_file(self, cursor, limit):
+        with self._cond:
+            i = bisect.bisect_right(self._offsets, (cursor + 1, float("inf"))) - 1
+            offset = self._offsets[i][1] if i >= 0 else 0
+        events = []
+        for event in self._iter_file(offset):
+            if event["seq"] <= cursor:
+                continue
+            events.append(event)
+            if len(events) >= limit:
+                break
+        return events
+
+    def _iter_file(self, offset=0):
+        try:
+            with open(self.filepath, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # a write still in progress
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            return
+
+
+def normalize_bound(value):
+    """
+    Parse an ISO-8601 export bound into the Israel-time isoformat that
+    timestamps are stored in, so text comparison orders correctly. Naive
+    values are taken as Israel time. Raises ValueError on bad input.
+    """
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=config.IL_TZ)
+    return dt.astimezone(config.IL_TZ).isoformat()
+
+
+def _retention_cutoff():
+    return (now_il() - timedelta(days=config.HISTORY_RETENTION_DAYS)).isoformat()
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def sse_chunks(events):
+    """Format follow() output as Server-Sent Events; ids let EventSource resume."""
+    for event in events:
+        if event is None:
+            yield ": keepalive\n\n"
+            continue
+        yield f"id: {event['seq']}\nevent: transition\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def ndjson_chunks(events):
+    for event in events:
+        if event is not None:
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+
+def csv_gzip_chunks(rows):
+    """Stream rows as a gzip-compressed CSV, one compressed chunk per batch."""
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 emits a gzip container
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for batch in _batched(rows, EXPORT_BATCH_ROWS):
+        writer.writerows(batch)
+        chunk = gz.compress(buf.getvalue().encode("utf-8"))
+        buf.seek(0)
+        buf.truncate()
+        if chunk:
+            yield chunk
+    yield gz.compress(buf.getvalue().encode("utf-8")) + gz.flush()
+
+
+class _ChunkSink:
+    """Write-only file object for ParquetWriter that hands bytes out as they are written."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_chunks(rows):
+    """Stream rows as a Parquet file, one row group per batch. Requires pyarrow."""
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("parquet export requires pyarrow")
+    schema = pa.schema([
+        (f, pa.int64() if f == "seq" else pa.string()) for f in EXPORT_FIELDS
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for batch in _batched(rows, EXPORT_BATCH_ROWS):
+            writer.write_table(pa.Table.from_pylist(
+                [{f: r.get(f) for f in EXPORT_FIELDS} for r in batch], schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()